@@ -4,14 +4,22 @@ Configuration module for the CLI Weather Application.
 Loads environment variables, defines file paths, sets default configurations,
 and handles loading and saving application settings.
 """
+import os
+import copy
 import json
 import logging
 from pathlib import Path
-from typing import Dict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
 from datetime import timedelta
 from logging.handlers import RotatingFileHandler
 from dotenv import dotenv_values
-from .utils import CLIWeatherException
+from .utils import CLIWeatherException, json_loads
+
+try:  # File locking is only available on POSIX systems.
+    import fcntl
+except ImportError:
+    fcntl = None
 
 logger = logging.getLogger(__file__)
 
@@ -50,8 +58,16 @@ DEFAULT_CONFIG = {
     }
 }
 
+# In-memory copy of the configuration, reused until the file changes on disk.
+_CFG_CACHE: Dict | None = None
+_CFG_MTIME: Tuple | None = None
+
 # Time for cached data to expire.
 CACHE_EXPIRY = timedelta(minutes=30)
+# Time for cached geocoding results to expire.
+GEOCODE_CACHE_EXPIRY = timedelta(hours=24)
+# Time for the cached IP-based location to expire, shorter since the network can change between runs.
+IP_LOCATION_CACHE_EXPIRY = timedelta(minutes=30)
 
 # Unit for displaying activity criteria.
 UNITS = {
@@ -73,8 +89,15 @@ def configure_logging():
 )
 
 
+def _config_stamp() -> Tuple:
+    """Identifies the current version of the config file on disk."""
+    stat = CONFIG_FILE.stat()
+    return (str(CONFIG_FILE), stat.st_mtime_ns, stat.st_size)
+
+
 def load_config() -> Dict:
     """Loads the configuration from the config file or returns the default."""
+    global _CFG_CACHE, _CFG_MTIME
     if not CONFIG_FILE.exists():
         logger.warning(f"Configuration file not found. Creating default at: {CONFIG_FILE}")
         try:
@@ -85,9 +108,13 @@ def load_config() -> Dict:
             return DEFAULT_CONFIG
 
     try:
-        with open(CONFIG_FILE, encoding='utf-8') as f:
-            config = json.load(f)
-            return config
+        stamp = _config_stamp()
+        if stamp == _CFG_MTIME:
+            return _CFG_CACHE
+        with open(CONFIG_FILE, "rb") as f:
+            config = json_loads(f.read())
+        _CFG_CACHE, _CFG_MTIME = config, stamp
+        return config
     except json.JSONDecodeError as e:
         logger.error(f"Invalid JSON in configuration file: {e}")
         print("Error: Invalid configuration file. Using defaults.")
@@ -99,13 +126,47 @@ def load_config() -> Dict:
 
 def save_config(data: Dict) -> None:
     """Saves the configuration data to the config file."""
+    global _CFG_CACHE, _CFG_MTIME
     try:
         logger.debug("Saving configuration...")
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
+        # Write to a temporary file first so the config file is never left half written.
+        temp_file = CONFIG_FILE.with_suffix(".tmp")
+        with open(temp_file, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=4)
-            logger.debug("Configuration saved successfully.")
+        os.replace(temp_file, CONFIG_FILE)
+        # Keep the saved data as the cached copy, no need to read it back.
+        _CFG_CACHE, _CFG_MTIME = data, _config_stamp()
+        logger.debug("Configuration saved successfully.")
     except (json.JSONDecodeError, FileNotFoundError,OSError) as e:
+        _CFG_MTIME = None
         logger.error(f"Error saving data to configuration: {e}")
         raise CLIWeatherException(f"Error saving data to configuration. {e}")
     except Exception as e:
+        _CFG_MTIME = None
         logger.exception(f"Error saving data to configuration. {e}")
+
+
+@contextmanager
+def _config_lock() -> Iterator[None]:
+    """Holds an exclusive lock on the configuration, where supported."""
+    if fcntl is None:
+        yield
+        return
+    with open(CONFIG_FILE.with_suffix(".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def editing_config() -> Iterator[Dict]:
+    """
+    Loads the configuration for editing and saves all changes in a single write.
+    Nothing is saved if the block raises, the loaded configuration is left untouched.
+    """
+    with _config_lock():
+        config = copy.deepcopy(load_config())
+        yield config
+        save_config(config)
@@ -1,7 +1,7 @@
 """Activity management functions."""
 import logging
 from typing import Dict
-from ..config import UNITS, load_config, save_config
+from ..config import UNITS, load_config, editing_config
 from ..utils import confirm, choose
 
 logger = logging.getLogger(__file__)
@@ -11,9 +11,8 @@ logger = logging.getLogger(__file__)
 def save_activity(activity_name: str, criteria: Dict) -> None:
     """Saves activity criteria to the configuration file."""
     logger.debug(f"Saving activity: {activity_name}")
-    configuration = load_config()
-    configuration.setdefault("activities", {})[activity_name] = criteria
-    save_config(configuration)
+    with editing_config() as configuration:
+        configuration.setdefault("activities", {})[activity_name] = criteria
     logger.debug(f"'{activity_name}' saved successfully.")
 
 
@@ -134,13 +133,16 @@ def delete_activity() -> None:
         return
     if activity_name == "Back":
         return
-    config = load_config()
-    activities= config.get("activities")
+    activities= load_config().get("activities")
     if not activities:
         logger.error("No activities configured.")
         print("No activities found, Please add one first.")
         return
     if confirm(f"Do you want to remove this activity? {activity_name}:  {activities[activity_name]}"):
-        del config["activities"][activity_name]
-        save_config(config)
+        # Another instance may have removed it since it was chosen.
+        with editing_config() as config:
+            removed = config.get("activities", {}).pop(activity_name, None)
+        if removed is None:
+            print(f"\n{activity_name.title()} activity was already removed.")
+            return
         print(f"\n{activity_name.title()} activity removed successfully.")
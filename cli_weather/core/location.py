@@ -1,83 +1,376 @@
 """Location management functions."""
+import re
+import sys
+import time
+import random
 import logging
-from json.decoder import JSONDecodeError
-from typing import Dict, Tuple
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
 import requests
-import geopy
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError, GeocoderUnavailable, GeocoderParseError
-from ..config import VARS, load_config, save_config
-from ..utils import CLIWeatherException, confirm, choose
+from requests.adapters import HTTPAdapter
+from ..config import VARS, CACHED_DIR, GEOCODE_CACHE_EXPIRY, IP_LOCATION_CACHE_EXPIRY, load_config, editing_config
+from ..utils import CLIWeatherException, CacheManager, confirm, choose, json_loads
 
 logger = logging.getLogger(__file__)
 
+# Comma separated latitude/longitude pair, e.g., "14.5987713, 120.9833966".
+_NUMBER = r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?"
+_COORD_RE = re.compile(rf"^\s*({_NUMBER})\s*,\s*({_NUMBER})\s*$")
+# Longest sensible coordinate string, two full precision floats with some whitespace.
+_MAX_COORD_LENGTH = 64
+
+# Use caching for geocoding results, addresses rarely move.
+geocode_cache = CacheManager(CACHED_DIR, GEOCODE_CACHE_EXPIRY)
+ip_location_cache = CacheManager(CACHED_DIR, IP_LOCATION_CACHE_EXPIRY)
+
+# Seconds to wait for each geocoder before falling back to the next one.
+GEOCODER_TIMEOUT = 3
+
+# Shared HTTP session and geocoders so connections are kept alive between lookups.
+# geopy is slow to import, the geocoders are only created once geocoding is needed.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=4))
+_GEOCODERS = None
+_RATE_LIMITER = None
+# Guards the lazy creation above when locations are resolved from several threads.
+_INIT_LOCK = threading.Lock()
+
+# Total time budget in seconds for finding the current location.
+CURRENT_LOCATION_TIMEOUT = 8.0
+# Total time budget in seconds for finding a location by address, across all geocoders and retries.
+ADDRESS_LOCATION_TIMEOUT = 10.0
+# Seconds to reuse the current location before looking it up again.
+CURRENT_LOCATION_CACHE_SECONDS = 300
+# Seconds to wait for each IP geolocation service before falling back to the next one.
+IP_GEOLOCATION_TIMEOUT = 3
+
+
+def _geocoders() -> List:
+    """Returns the geocoders to try in turn, creating them on first use."""
+    global _GEOCODERS
+    with _INIT_LOCK:
+        if _GEOCODERS is None:
+            from geopy.adapters import RequestsAdapter
+            from geopy.geocoders import ArcGIS, Nominatim, Photon
+
+            class SharedSessionAdapter(RequestsAdapter):
+                """Sends the geocoder requests through the shared session."""
+
+                def __init__(self, *, proxies, ssl_context):
+                    super().__init__(proxies=proxies, ssl_context=ssl_context)
+                    self.session.close()
+                    self.session = _SESSION
+
+                def __del__(self):
+                    pass  # The shared session outlives the geocoders, don't close it.
+
+            options = {
+                "user_agent": "weather_assistant",
+                "timeout": GEOCODER_TIMEOUT,
+                "adapter_factory": SharedSessionAdapter
+            }
+            # All are free to use without an API key.
+            _GEOCODERS = [Nominatim(**options), Photon(**options), ArcGIS(**options)]
+    return _GEOCODERS
+
+
+def _throttle(func: Callable, *args, **kwargs) -> Any:
+    """
+    Calls a Nominatim method within its usage policy of at most 1 request per second.
+    Retries and error handling are left to `_retry` and the callers.
+    """
+    global _RATE_LIMITER
+    with _INIT_LOCK:
+        if _RATE_LIMITER is None:
+            from geopy.extra.rate_limiter import RateLimiter
+            _RATE_LIMITER = RateLimiter(
+                lambda func, *args, **kwargs: func(*args, **kwargs),
+                min_delay_seconds=1,
+                max_retries=0,
+                swallow_exceptions=False
+            )
+    return _RATE_LIMITER(func, *args, **kwargs)
+
+
+def _is_transient(error: Exception) -> bool:
+    """Checks if an error is a transient network failure."""
+    from geopy.exc import GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited, GeocoderServiceError
+    if isinstance(error, requests.exceptions.HTTPError):
+        # Client errors won't go away on retry, except timeouts and rate limits.
+        status = error.response.status_code if error.response is not None else 500
+        return status in (408, 429) or status >= 500
+    # geopy raises a plain GeocoderServiceError for 500/502 responses, its subclasses are client errors.
+    if type(error) is GeocoderServiceError:
+        return True
+    return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError, GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited))
+
+
+def _retry(func: Callable, *args, attempts: int = 3, base: float = 1.0, cap: float = 8.0, deadline: float | None = None, **kwargs) -> Any:
+    """
+    Calls a function, retrying transient errors with jittered exponential backoff.
+    No retry is made if waiting for it would pass the `time.monotonic()` deadline.
+    """
+    for attempt in range(attempts):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if not _is_transient(e) or attempt == attempts - 1:
+                raise
+            delay = min(cap, base * 2 ** attempt) * (1 + random.uniform(0, 0.5))
+            # Wait at least as long as a rate limited service asked for.
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after:
+                delay = max(delay, retry_after)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            logger.warning(f"Transient error: {e}, retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+def _time_left(deadline: float) -> float:
+    """Seconds remaining until the deadline, floored to a usable request timeout."""
+    return max(deadline - time.monotonic(), 0.1)
+
+
+def _fetch(url: str, timeout: float) -> requests.Response:
+    """Sends a GET request with the shared session and checks the response status."""
+    response = _SESSION.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response
+
+
+def _parse_ipapi(response: requests.Response) -> Tuple[float, float]:
+    """Parses the coordinates from an ipapi.co response."""
+    data = json_loads(response.content)
+    return float(data["latitude"]), float(data["longitude"])
+
+
+# IP geolocation services to try in turn, with a parser for their response.
+# ipinfo.io/loc answers with just "lat,lon" in plain text, no JSON to decode.
+# Its body is plain ASCII, decoding it directly skips requests' encoding detection.
+IP_GEOLOCATION_SERVICES = [
+    ("https://ipinfo.io/loc", lambda response: _parse_coordinates(response.content.decode("ascii", "replace"))),
+    ("https://ipapi.co/json/", _parse_ipapi)
+]
+
+
+def _ip_location(deadline: float) -> Tuple[float, float]:
+    """
+    Gets approximate coordinates from each IP geolocation service in turn.
+    Raises the last error if every service failed.
+    """
+    for url, parse in IP_GEOLOCATION_SERVICES:
+        try:
+            response = _fetch(url, timeout=min(IP_GEOLOCATION_TIMEOUT, _time_left(deadline)))
+            coordinates = parse(response)
+            if coordinates is None:
+                raise ValueError(f"Unexpected response: {response.content[:100]!r}")
+            return coordinates
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            logger.warning(f"IP geolocation from {url} failed: {e}")
+            last_error = e
+    raise last_error
+
+
+def _first_result(method: str, *args, deadline: float | None = None, **kwargs) -> Any:
+    """
+    Calls a geocoding method on each geocoder in turn and returns the first location found.
+    Raises the last error only if every geocoder failed, None if none found the location.
+    Raises `GeocoderTimedOut` if the deadline leaves no time to try any geocoder.
+    """
+    from geopy.exc import GeocoderServiceError, GeocoderTimedOut
+    from geopy.geocoders import Nominatim
+    last_error = None
+    answered = False
+    for geocoder in _geocoders():
+        if deadline is not None and deadline - time.monotonic() <= 0.5:
+            if last_error is None and not answered:
+                # Not a missing location, no geocoder got a chance to look for it.
+                raise GeocoderTimedOut("Deadline reached before any geocoder was tried.")
+            break
+
+        def call(func: Callable = getattr(geocoder, method)) -> Any:
+            # Take the timeout from the time left once the rate limiter let the request through.
+            if deadline is not None:
+                kwargs["timeout"] = min(GEOCODER_TIMEOUT, _time_left(deadline))
+            return func(*args, **kwargs)
+
+        try:
+            location = _throttle(call) if isinstance(geocoder, Nominatim) else call()
+        except GeocoderServiceError as e:
+            logger.warning(f"{type(geocoder).__name__} failed: {e}")
+            last_error = e
+            continue
+        if location:
+            return location
+        answered = True
+    if last_error is not None and not answered:
+        raise last_error
+    return None
+
 
 # === Location management functions === #
-def load_locations(add_sensitive: bool = False) -> Dict:
+def load_locations(add_sensitive: bool = False) -> Dict[str, Tuple[float, float]]:
     """Loads location data from config and optionally from environment variables."""
     logger.debug("Loading locations...")
-    non_sensitive_locations = load_config().get("locations", {})
-    sensitive_locations = {
-        key: value for key, value in VARS.items()
-        if is_valid_location(value)
-    }
-    locations = {**sensitive_locations, **non_sensitive_locations} if add_sensitive else non_sensitive_locations
+    non_sensitive_locations = {}
+    for location_name, coordinate in load_config().get("locations", {}).items():
+        coordinates = _parse_coordinates(coordinate)
+        if coordinates is None:
+            logger.warning(f"Skipping location '{location_name}' with invalid coordinates: {coordinate}")
+            continue
+        non_sensitive_locations[location_name] = coordinates
+    locations = {**_SENSITIVE_LOCATIONS, **non_sensitive_locations} if add_sensitive else non_sensitive_locations
 
     logger.debug("Locations loaded successfully.")
     return locations
 
 
+def _parse_coordinates(value: str) -> Tuple[float, float] | None:
+    """Parses a latitude/longitude string into floats, returns None if it is not valid."""
+    # Cheap checks first, most environment variables are API keys or URLs, not coordinates.
+    if not isinstance(value, str) or "," not in value or len(value) > _MAX_COORD_LENGTH:
+        return None
+    match = _COORD_RE.match(value)
+    if not match:
+        return None
+    lat, lon = float(match[1]), float(match[2])
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return lat, lon
+    return None
+
+
 def is_valid_location(value: str) -> bool:
     """Checks if a given string represents valid latitude/longitude coordinates."""
+    logger.debug(f"Checking if '{value}' is valid location coordinate.")
+    return _parse_coordinates(value) is not None
+
+
+def _find_sensitive_locations() -> Dict[str, Tuple[float, float]]:
+    """Collects the location coordinates defined in environment variables."""
+    sensitive_locations = {}
+    for key, value in VARS.items():
+        coordinates = _parse_coordinates(value)
+        if coordinates is not None:
+            sensitive_locations[key] = coordinates
+    return sensitive_locations
+
+
+# Environment variables are loaded once at startup, so their locations are too.
+_SENSITIVE_LOCATIONS = _find_sensitive_locations()
+
+
+def invalidate_sensitive_cache() -> None:
+    """Recollects the locations from environment variables after VARS changes."""
+    global _SENSITIVE_LOCATIONS
+    _SENSITIVE_LOCATIONS = _find_sensitive_locations()
+
+
+def _save_cache(cache: CacheManager, key: str, data: dict) -> None:
+    """Saves a lookup result to the cache, a failed write only costs the next lookup its cache hit."""
     try:
-        logger.debug(f"Checking if '{value}' is valid location coordinate.")
-        lat, lon = map(float, value.split(","))
-        return -90 <= lat <= 90 and -180 <= lon <= 180
-    except (ValueError, TypeError):
-        return False
+        cache.save(key, data)
+    except OSError as e:
+        logger.warning(f"Failed to save cache entry: {e}")
 
 
-def get_location(addr: str = "me") -> Tuple[str, float, float] | Tuple[None, None, None]:
-    """Get location by address or approximate current location."""
-    geopy.adapters.BaseAdapter.session = requests.Session()
+def _geocode_address(addr: str) -> Tuple[str, float, float] | None:
+    """Geocodes an address, using the cached result if available."""
+    cache_key = geocode_cache._generate_key("geocode", addr.strip().lower())
+    cached = geocode_cache.load(cache_key)
+    if cached:
+        logger.debug(f"Using cached geocoding result for: {addr}")
+        return cached["address"], cached["lat"], cached["lon"]
+
+    deadline = time.monotonic() + ADDRESS_LOCATION_TIMEOUT
+    location = _retry(lambda: _first_result("geocode", addr, deadline=deadline), deadline=deadline)
+    if not location:
+        return None
+    _save_cache(geocode_cache, cache_key, {"address": location.address, "lat": location.latitude, "lon": location.longitude})
+    return location.address, location.latitude, location.longitude
+
+
+def _reverse(lat: float, lon: float, deadline: float) -> str | None:
+    """
+    Reverse geocodes coordinates into an address, using the cached result if available.
+    Gives up and returns None if too little time is left before the deadline.
+    """
+    # Round to ~100m so nearby IP-based lookups share a cache entry.
+    cache_key = geocode_cache._generate_key("reverse", round(lat, 3), round(lon, 3))
+    cached = geocode_cache.load(cache_key)
+    if cached:
+        logger.debug(f"Using cached reverse geocoding result for: {lat}, {lon}")
+        return cached["address"]
+
+    if deadline - time.monotonic() <= 0.5:
+        logger.warning("Not enough time left for reverse geocoding.")
+        return None
+    location = _retry(lambda: _first_result("reverse", (lat, lon), exactly_one=True, deadline=deadline), deadline=deadline)
+    if not location:
+        return None
+    _save_cache(geocode_cache, cache_key, {"address": location.address, "lat": lat, "lon": lon})
+    return location.address
+
+
+def _cached_ip_location(deadline: float) -> Tuple[float, float]:
+    """Gets approximate coordinates from the IP address, using the cached result if available."""
+    cache_key = ip_location_cache._generate_key("ip_location")
+    cached = ip_location_cache.load(cache_key)
+    if cached:
+        logger.debug("Using cached IP geolocation result.")
+        return cached["lat"], cached["lon"]
+
+    lat, lon = _retry(lambda: _ip_location(deadline), deadline=deadline)
+    _save_cache(ip_location_cache, cache_key, {"lat": lat, "lon": lon})
+    return lat, lon
+
+
+@lru_cache(maxsize=1)
+def _current_location(time_bucket: int) -> Tuple[str, float, float]:
+    """
+    Gets the approximate current location from the IP address.
+    The IP rarely changes, so the result is reused for calls within the same `time_bucket`.
+    """
+    from geopy.exc import GeocoderTimedOut, GeocoderServiceError, GeocoderUnavailable
+    logger.debug("Getting current location...")
+    try:
+        # Share one deadline between both lookups to bound the total wait.
+        deadline = time.monotonic() + CURRENT_LOCATION_TIMEOUT
+        # Use IP-based geolocation to get approximate current location
+        lat, lon = _cached_ip_location(deadline)
 
-    if addr.lower() == "me":  # Handle current location separately
-        logger.debug("Getting current location...")
         try:
-            # Use IP-based geolocation to get approximate current location
-            ip_geolocation_url = "https://ipinfo.io/json"
-            response = requests.get(ip_geolocation_url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            lat, lon = map(float, data["loc"].split(","))
-
-            try:
-                # Use reverse geocoding to refine location details
-                geolocator = Nominatim(user_agent="weather_assistant", timeout=10)
-                location = geolocator.reverse((lat, lon), exactly_one=True)
-                address = location.address if location else "Approximate location based on IP"
-                return address, lat, lon
-            except (GeocoderTimedOut, GeocoderUnavailable, GeocoderServiceError) as e:
-                logger.warning(f"Reverse geocoding failed: {e}")
-                return "Approximate location based on IP", lat, lon
-
-        except requests.exceptions.Timeout as e:
-            logger.error(f"Error getting current location from IP, Connection timed out: {e}")
-            raise CLIWeatherException("Failed to get your current location, Request timed out. Please check your network connection.")
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"Error getting current location from IP, Connection error: {e}")
-            raise CLIWeatherException("Failed to get your current location, Network error. Please check your connection and try again.")
-        except (requests.exceptions.RequestException, JSONDecodeError) as e:
-            logger.exception(f"Error Getting current location: {e}")
-            raise CLIWeatherException("Could not get current location.")
+            # Use reverse geocoding to refine location details
+            address = _reverse(lat, lon, deadline) or "Approximate location based on IP"
+            return address, lat, lon
+        except (GeocoderTimedOut, GeocoderUnavailable, GeocoderServiceError) as e:
+            logger.warning(f"Reverse geocoding failed: {e}")
+            return "Approximate location based on IP", lat, lon
+
+    except requests.exceptions.Timeout as e:
+        logger.error(f"Error getting current location from IP, Connection timed out: {e}")
+        raise CLIWeatherException("Failed to get your current location, Request timed out. Please check your network connection.")
+    except requests.exceptions.ConnectionError as e:
+        logger.error(f"Error getting current location from IP, Connection error: {e}")
+        raise CLIWeatherException("Failed to get your current location, Network error. Please check your connection and try again.")
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        logger.exception(f"Error Getting current location: {e}")
+        raise CLIWeatherException("Could not get current location.")
 
+
+def get_location(addr: str = "me") -> Tuple[str, float, float] | Tuple[None, None, None]:
+    """Get location by address or approximate current location."""
+    if addr.lower() == "me":  # Handle current location separately
+        return _current_location(int(time.time() // CURRENT_LOCATION_CACHE_SECONDS))
     else:  # Use Geopy for address-based geocoding
+        from geopy.exc import GeocoderTimedOut, GeocoderServiceError, GeocoderUnavailable, GeocoderParseError
         logger.debug(f"Getting location for: {addr}")
         try:
-            geolocator = Nominatim(user_agent="weather_assistant", timeout=10)
-            location = geolocator.geocode(addr)
+            location = _geocode_address(addr)
             if location:
-                return location.address, location.latitude, location.longitude
+                return location
             else:
                 logger.error(f"Geolocator could not find location: '{addr}'")
                 raise CLIWeatherException(f"Could not find location: '{addr}'")
@@ -98,6 +391,23 @@ def get_location(addr: str = "me") -> Tuple[str, float, float] | Tuple[None, Non
             raise CLIWeatherException(f"Unexpected error occurred during geocoding: {e}")
 
 
+def resolve_many(addrs: List[str]) -> List[Tuple[str, float, float] | Tuple[None, None, None]]:
+    """
+    Gets the locations of several addresses concurrently, in the same order.
+    Addresses that could not be found resolve to (None, None, None).
+    """
+    def resolve(addr: str) -> Tuple[str, float, float] | Tuple[None, None, None]:
+        try:
+            return get_location(addr)
+        except CLIWeatherException as e:
+            logger.warning(f"Could not resolve '{addr}': {e}")
+            return None, None, None
+
+    logger.debug(f"Resolving {len(addrs)} locations...")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        return list(executor.map(resolve, addrs))
+
+
 def get_location_input() -> Tuple[str, str]:
     """Gets location name and coordinates input from the user."""
     try:
@@ -114,13 +424,12 @@ def get_location_input() -> Tuple[str, str]:
 def save_location(location_name: str, coordinate: str) -> None:
     """Saves a location into configuration file."""
     logger.debug(f"Saving location : {location_name}...")
-    configuration = load_config()
-    configuration.setdefault("locations", {})[location_name] = coordinate
-    save_config(configuration)
+    with editing_config() as configuration:
+        configuration.setdefault("locations", {})[location_name] = coordinate
     logger.debug(f"{location_name} location saved successfully.")
 
 
-def choose_location(task: str = "", *, add_sensitive: bool = False, add_search: bool = False, add_current: bool = False) -> Tuple[str, Tuple[str, str]] | None:
+def choose_location(task: str = "", *, add_sensitive: bool = False, add_search: bool = False, add_current: bool = False) -> Tuple[str, Tuple[float, float] | Tuple[None, None]] | None:
     """Prompt the user to choose a location from the saved locations."""
     locations = load_locations(add_sensitive)
     if not locations:
@@ -128,16 +437,15 @@ def choose_location(task: str = "", *, add_sensitive: bool = False, add_search:
         return
     # Add choice to use current location.
     if add_current:
-        locations["Current location"] = "N, A"
+        locations["Current location"] = (None, None)
     # Add choice to search for a location using an address.
     if add_search:
-        locations["Search location"] = "N, A"
+        locations["Search location"] = (None, None)
     # Add choice to go back from previous menu.
-    locations["Back"] = "N, A"
+    locations["Back"] = (None, None)
     print(f"\nChoose a location {task}." if not add_search else f"Choose or search a location {task}.")
     location_name = choose(list(locations))
-    lat, lon = locations[location_name].split(",")
-    return location_name, (lat.strip(), lon.strip())
+    return location_name, locations[location_name]
 
 
 def search_location() -> None:
@@ -165,12 +473,11 @@ def view_locations() -> None:
     if not locations:
         print("No locations found. Please add one first.")
         return
-    print("\nYour Locations:\n")
-    for location_name, coordinate in locations.items():
-        lat, lon = coordinate.split(",")
-        print(f"""{location_name.title()}:
-            latitude: {lat.strip()}
-            longitude: {lon}""")
+    # Build the whole listing first and write it at once.
+    parts = ["\nYour Locations:\n\n"]
+    for location_name, (lat, lon) in locations.items():
+        parts.append(f"{location_name.title()}:\n            latitude: {lat}\n            longitude: {lon}\n")
+    sys.stdout.write("".join(parts))
 
 
 def add_location() -> None:
@@ -194,9 +501,8 @@ def save_current_location() -> None:
     if confirm("Do you want to rename location address?"):
         current_addr = input("Enter new name for this location: ")
     if confirm("Save this location?"):
-        config = load_config()
-        config["locations"][current_addr] = f"{str(lat)}, {str(lon)}"
-        save_config(config)
+        with editing_config() as config:
+            config.setdefault("locations", {})[current_addr] = f"{str(lat)}, {str(lon)}"
         print("Current location saved successfully.")
 
 
@@ -210,7 +516,10 @@ def delete_location() -> None:
     if location_name == "Back":
         return
     if confirm(f"Are you sure you want to delete '{location_name}'?"):
-            config = load_config()
-            del config["locations"][location_name]
-            save_config(config)
+            # Another instance may have removed it since it was chosen.
+            with editing_config() as config:
+                removed = config.get("locations", {}).pop(location_name, None)
+            if removed is None:
+                print(f"\n'{location_name}' was already removed.")
+                return
             print(f"\n'{location_name}' deleted successfully.")
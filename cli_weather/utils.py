@@ -4,14 +4,21 @@ Utility functions for the CLI Weather Application.
 Provides helper functions for exception handling, caching, logging,
 user input, and menu navigation.
 """
+import os
 import sys
 import json
 import logging
 import hashlib
+import tempfile
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import Any, Dict, List, Union
 from datetime import datetime, timedelta
 
+try:  # Use orjson when installed, it parses and serializes JSON faster.
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__file__)
 
 
@@ -19,6 +26,20 @@ class CLIWeatherException(Exception):
     """Raise for clear and user friendly error messages."""
 
 
+def json_loads(data: Union[str, bytes]) -> Any:
+    """Parses a JSON document, using orjson if available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj: Any) -> str:
+    """Serializes an object to a compact JSON string, using orjson if available."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
 class CacheManager:
     """Handles caching of data with expiry logic."""
 
@@ -36,8 +57,16 @@ class CacheManager:
     def save(self, key: str, data: dict) -> None:
         """Saves data to the cache with a timestamp."""
         cache_file = self.cache_dir / key
-        with cache_file.open('w') as file:
-            json.dump({"timestamp": datetime.now().isoformat(), "data": data}, file)
+        # Write to a temporary file first so a reader never sees a partial entry.
+        # Each write gets its own, concurrent saves of the same key must not share one.
+        fd, temp_file = tempfile.mkstemp(dir=self.cache_dir, prefix=f"{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(json_dumps({"timestamp": datetime.now().isoformat(), "data": data}))
+            os.replace(temp_file, cache_file)
+        except BaseException:
+            os.unlink(temp_file)
+            raise
         logger.debug("Cache file saved successfully.")
 
     def load(self, key: str) -> Union[Dict, None]:
@@ -46,12 +75,11 @@ class CacheManager:
         if not cache_file.exists():
             return None
 
-        with cache_file.open('r') as file:
-            cached = json.load(file)
-            timestamp = datetime.fromisoformat(cached["timestamp"])
-            if datetime.now() - timestamp < self.expiry:
-                logger.debug("Loaded cached data successfully.")
-                return cached["data"]
+        cached = json_loads(cache_file.read_bytes())
+        timestamp = datetime.fromisoformat(cached["timestamp"])
+        if datetime.now() - timestamp < self.expiry:
+            logger.debug("Loaded cached data successfully.")
+            return cached["data"]
 
         # Expired cache, delete the file
         cache_file.unlink()
@@ -150,9 +178,9 @@ def run_menu(options: List[Dict], prompt: str = "", main: bool = False) -> None:
             print(f"\n{prompt}")
             print("-" * (len(prompt) + 5))
             for index, option in enumerate(options, start=1):
-                print(f"{index}. {list(option)[0]}")
-            index = get_index(list(options))
-            func = list(options[index].values())[0]
+                print(f"{index}. {next(iter(option))}")
+            index = get_index(options)
+            func = next(iter(options[index].values()))
             print()
             if main and func is None:
                 logging.debug("App closed.")
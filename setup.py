@@ -16,6 +16,9 @@ setup(
         "requests",
         "python-dotenv"
     ],
+    extras_require={
+        "fast": ["orjson"]
+    },
     python_requires=">=3.7",
     entry_points={
         "console_scripts": [
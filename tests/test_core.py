@@ -1,20 +1,23 @@
+import io
 import unittest
 import json
 import tempfile
+import threading
 from pathlib import Path
-from unittest.mock import patch, mock_open
+from unittest.mock import Mock, patch, mock_open
 from datetime import datetime, timedelta
 
 from cli_weather.core.weather import fetch_weather_data, parse_weather_data, filter_best_days, save_weather_to_file, display_grouped_forecast
 from cli_weather.utils import CacheManager, CLIWeatherException, choose_local_path
 import requests
 
-from cli_weather.core.location import load_locations, is_valid_location, get_location, save_location, view_locations
-from cli_weather.config import load_config, save_config, CONFIG_FILE
+from cli_weather.core.location import logger as location_logger, ADDRESS_LOCATION_TIMEOUT, load_locations, is_valid_location, get_location, save_location, view_locations, delete_location, resolve_many, _retry, _current_location, _geocoders, _SESSION
+from cli_weather.config import load_config, save_config, editing_config, CONFIG_FILE
 #from cli_weather.utils import CLIWeatherException
 import geopy.exc
+from geopy.geocoders import Nominatim
 
-from cli_weather.core.activity import save_activity, get_activity_criteria, view_activities, choose_activity
+from cli_weather.core.activity import delete_activity, save_activity, get_activity_criteria, view_activities, choose_activity
 
 # Sample test data
 SAMPLE_WEATHER_DATA = {
@@ -158,34 +161,69 @@ class TestWeather(unittest.TestCase):
 
 class TestLocation(unittest.TestCase):
 
+    def setUp(self):
+        # Keep geocoding results out of the real cache directory.
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.geocode_cache = CacheManager(Path(self.temp_dir.name), timedelta(hours=24))
+        patcher = patch('cli_weather.core.location.geocode_cache', self.geocode_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ip_location_cache = CacheManager(Path(self.temp_dir.name) / "ip", timedelta(minutes=30))
+        self.ip_location_cache.cache_dir.mkdir()
+        patcher = patch('cli_weather.core.location.ip_location_cache', self.ip_location_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Don't wait on the geocoder rate limit.
+        patcher = patch('cli_weather.core.location._throttle', lambda func, *args, **kwargs: func(*args, **kwargs))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Start each test without a remembered current location.
+        _current_location.cache_clear()
+        self.addCleanup(_current_location.cache_clear)
+        self.addCleanup(self.temp_dir.cleanup)
+
     @patch('cli_weather.core.location.load_config')
     def test_load_locations(self, mock_load_config):
         mock_load_config.return_value = SAMPLE_CONFIG_DATA
         locations = load_locations()
-        self.assertEqual(locations, SAMPLE_CONFIG_DATA["locations"])
+        self.assertEqual(locations, {"London": (51.5074, 0.1278), "New York": (40.7128, -74.0060)})
 
         mock_load_config.return_value = {"activities":{}} # No locations in config
         self.assertEqual(load_locations(), {})
 
+        # Locations from environment variables are added when requested
+        with patch('cli_weather.core.location._SENSITIVE_LOCATIONS', {"Home": (1.0, 2.0)}):
+            self.assertEqual(load_locations(), {})
+            self.assertEqual(load_locations(add_sensitive=True), {"Home": (1.0, 2.0)})
+
+        # Locations with invalid coordinates are skipped
+        mock_load_config.return_value = {"locations": {"Bad": "abc, def", "Good": "1.5, 2.5"}}
+        self.assertEqual(load_locations(), {"Good": (1.5, 2.5)})
+
 
     def test_is_valid_location(self):
         self.assertTrue(is_valid_location("10.0, 20.0"))
         self.assertFalse(is_valid_location("abc, def"))
         self.assertFalse(is_valid_location("91,0, 10")) # invalid coordinate
         self.assertFalse(is_valid_location("50.2, 181")) # Invalid coordinate
+        self.assertTrue(is_valid_location(" -33.5 ,1e-05 "))
+        self.assertFalse(is_valid_location("10.0, 20.0, 30.0"))
+        self.assertFalse(is_valid_location(None))
+        self.assertFalse(is_valid_location("https://example.com/api?key=abc"))
+        self.assertTrue(is_valid_location(f"{-0.12345678901234568}, {-179.12345678901234}"))
 
 
 
-    @patch('cli_weather.core.location.Nominatim')
-    @patch('cli_weather.core.location.requests.get')
-    def test_get_location_current(self, mock_requests_get, mock_nominatim):
+    @patch('cli_weather.core.location._GEOCODERS', new_callable=lambda: [Mock()])
+    @patch('cli_weather.core.location._SESSION')
+    def test_get_location_current(self, mock_session, mock_geocoders):
         # mocking current location data from ipinfo.io
-        mock_response = mock_requests_get.return_value
+        mock_response = mock_session.get.return_value
         mock_response.status_code = 200
-        mock_response.json.return_value = {'loc': '12.34,56.78', 'city':'Test City'}
+        mock_response.content = b'12.34,56.78\n'
 
         # Mock geolocator
-        mock_geolocator = mock_nominatim.return_value
+        mock_geolocator = mock_geocoders[0]
         mock_geolocator.reverse.return_value.address = "Test Address" # Mock address
 
 
@@ -194,31 +232,234 @@ class TestLocation(unittest.TestCase):
         self.assertEqual(lat, 12.34)
         self.assertEqual(lon, 56.78)
 
+        # Test current location is reused within the same process
+        mock_session.get.reset_mock()
+        self.assertEqual(get_location("me"), ("Test Address", 12.34, 56.78))
+        mock_session.get.assert_not_called()
+
+        # Test IP and reverse geocoding results are served from the disk cache in a new process
+        _current_location.cache_clear()
+        mock_geolocator.reverse.reset_mock()
+        address, lat, lon = get_location("me")
+        self.assertEqual(address, "Test Address")
+        mock_session.get.assert_not_called()
+        mock_geolocator.reverse.assert_not_called()
+
+        # Test a failed cache write doesn't lose the current location
+        _current_location.cache_clear()
+        with patch.object(self.ip_location_cache, "load", return_value=None), \
+                patch.object(self.ip_location_cache, "save", side_effect=OSError("No space left on device")), \
+                patch.object(self.geocode_cache, "save", side_effect=OSError("No space left on device")):
+            self.assertEqual(get_location("me"), ("Test Address", 12.34, 56.78))
+
         # Test approximate location if reverse geocoding fails
+        _current_location.cache_clear()
+        mock_response.content = b'1.23,4.56\n'
         mock_geolocator.reverse.return_value = None  # Simulate reverse geocoding failure
-        address, lat, lon = get_location("me")
+        with patch.object(self.ip_location_cache, "load", return_value=None):  # Simulate expired IP location
+            address, lat, lon = get_location("me")
         self.assertEqual(address, "Approximate location based on IP")
-        self.assertEqual(lat, 12.34)
-        self.assertEqual(lon, 56.78)
+        self.assertEqual(lat, 1.23)
+        self.assertEqual(lon, 4.56)
+
+
+
 
+    @patch('cli_weather.core.location.CURRENT_LOCATION_TIMEOUT', 0.3)
+    @patch('cli_weather.core.location._GEOCODERS', new_callable=lambda: [Mock()])
+    @patch('cli_weather.core.location._SESSION')
+    def test_get_location_current_over_budget(self, mock_session, mock_geocoders):
+        mock_session.get.return_value.content = b'12.34,56.78\n'
+        mock_geolocator = mock_geocoders[0]
 
+        # Reverse geocoding is skipped when the time budget is nearly spent
+        self.assertEqual(get_location("me"), ("Approximate location based on IP", 12.34, 56.78))
+        mock_geolocator.reverse.assert_not_called()
 
 
-    @patch('cli_weather.core.location.Nominatim')
-    def test_get_location_address(self, MockNominatim):
-        geolocator_mock = MockNominatim.return_value
+
+    @patch('cli_weather.core.location._GEOCODERS', new_callable=lambda: [Mock()])
+    def test_get_location_address(self, mock_geocoders):
+        geolocator_mock = mock_geocoders[0]
         geolocator_mock.geocode.return_value.address = "123 Main St, Anytown"
         geolocator_mock.geocode.return_value.latitude = 34.56
         geolocator_mock.geocode.return_value.longitude = -78.90
 
         self.assertEqual(get_location("Anytown"), ("123 Main St, Anytown", 34.56, -78.90))
 
+        # Test normalized address is served from cache
+        geolocator_mock.geocode.reset_mock()
+        self.assertEqual(get_location("  anytown "), ("123 Main St, Anytown", 34.56, -78.90))
+        geolocator_mock.geocode.assert_not_called()
+
+        # Test a failed cache write doesn't lose the geocoded location
+        with patch.object(self.geocode_cache, "save", side_effect=OSError("Read-only file system")):
+            self.assertEqual(get_location("Newtown"), ("123 Main St, Anytown", 34.56, -78.90))
+
         geolocator_mock.geocode.return_value = None  # Simulate location not found
         with self.assertRaisesRegex(CLIWeatherException, "Could not find location: 'Unknown Place'"):
             get_location("Unknown Place")
 
 
 
+    def test_get_location_address_time_budget(self):
+        # Fake clock, advanced by geocoder timeouts and retry sleeps
+        clock = [0.0]
+        fake_time = Mock()
+        fake_time.monotonic.side_effect = lambda: clock[0]
+        fake_time.sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+
+        def timed_out(*args, timeout, **kwargs):
+            clock[0] += timeout
+            raise geopy.exc.GeocoderTimedOut
+
+        geocoders = [Mock(), Mock(), Mock()]
+        for geocoder in geocoders:
+            geocoder.geocode.side_effect = timed_out
+
+        # Every geocoder timing out gives up within the total budget
+        with patch('cli_weather.core.location.time', fake_time), patch('cli_weather.core.location._GEOCODERS', geocoders):
+            with self.assertRaisesRegex(CLIWeatherException, "Geocoding timed out"):
+                get_location("Slowtown")
+        self.assertLessEqual(clock[0], ADDRESS_LOCATION_TIMEOUT)
+        self.assertEqual(sum(geocoder.geocode.call_count for geocoder in geocoders), 3)
+
+        # A retry left with too little time to try any geocoder is still a timeout, not a missing location
+        clock[0] = 0.0
+        def unavailable(*args, **kwargs):
+            clock[0] += 2.2
+            raise geopy.exc.GeocoderUnavailable
+        geocoders[2].geocode.side_effect = unavailable
+        fake_time.sleep.reset_mock()
+        with patch('cli_weather.core.location.time', fake_time), patch('cli_weather.core.location._GEOCODERS', geocoders), \
+                patch('cli_weather.core.location.random.uniform', return_value=0.4):
+            with self.assertRaisesRegex(CLIWeatherException, "Geocoding timed out"):
+                get_location("Paris")
+        fake_time.sleep.assert_called_once_with(1.4)
+        self.assertLessEqual(clock[0], ADDRESS_LOCATION_TIMEOUT)
+
+
+    def test_get_location_address_rate_limited(self):
+        # Time spent waiting on the Nominatim rate limit comes off the geocoder timeout
+        clock = [0.0]
+        fake_time = Mock()
+        fake_time.monotonic.side_effect = lambda: clock[0]
+
+        def throttle(func, *args, **kwargs):
+            clock[0] += 2.5
+            return func(*args, **kwargs)
+
+        nominatim = Mock(spec=Nominatim)
+        nominatim.geocode.return_value = Mock(address="123 Main St, Anytown", latitude=34.56, longitude=-78.90)
+        with patch('cli_weather.core.location.time', fake_time), patch('cli_weather.core.location._GEOCODERS', [nominatim]), \
+                patch('cli_weather.core.location._throttle', throttle), patch('cli_weather.core.location.ADDRESS_LOCATION_TIMEOUT', 4.0):
+            self.assertEqual(get_location("Anytown"), ("123 Main St, Anytown", 34.56, -78.90))
+        self.assertEqual(nominatim.geocode.call_args.kwargs["timeout"], 1.5)
+
+
+    @patch('cli_weather.core.location._SESSION')
+    def test_get_location_fallback(self, mock_session):
+        # IP geolocation falls back to the next service
+        fallback_response = Mock()
+        fallback_response.content = b'{"latitude": 12.34, "longitude": 56.78}'
+        mock_session.get.side_effect = [requests.exceptions.HTTPError(response=Mock(status_code=403)), fallback_response]
+
+        # Geocoding falls back to the next geocoder on failure or no result
+        failing, empty, working = Mock(), Mock(), Mock()
+        failing.reverse.side_effect = geopy.exc.GeocoderUnavailable
+        empty.reverse.return_value = None
+        working.reverse.return_value.address = "Fallback Address"
+        with patch('cli_weather.core.location._GEOCODERS', [failing, empty, working]):
+            self.assertEqual(get_location("me"), ("Fallback Address", 12.34, 56.78))
+
+        # Geocoding errors are raised only if every geocoder failed
+        failing.geocode.side_effect = geopy.exc.GeocoderServiceError
+        empty.geocode.return_value = None
+        with patch('cli_weather.core.location._GEOCODERS', [failing, empty]):
+            with self.assertRaisesRegex(CLIWeatherException, "Could not find location"):
+                get_location("Nowhere")
+        with patch('cli_weather.core.location._GEOCODERS', [failing]):
+            with self.assertRaisesRegex(CLIWeatherException, "Geocoding service error"):
+                get_location("Nowhere")
+
+
+    @patch('cli_weather.core.location._GEOCODERS', None)
+    def test_geocoders_share_session(self):
+        geocoders = _geocoders()
+        self.assertEqual([type(geocoder).__name__ for geocoder in geocoders], ["Nominatim", "Photon", "ArcGIS"])
+        for geocoder in geocoders:
+            self.assertIs(geocoder.adapter.session, _SESSION)
+        self.assertIs(_geocoders(), geocoders)
+
+
+    @patch('cli_weather.core.location.time.sleep')
+    def test_retry(self, mock_sleep):
+        # Transient errors are retried until the call succeeds
+        func = Mock(side_effect=[requests.exceptions.Timeout, geopy.exc.GeocoderUnavailable, "ok"])
+        self.assertEqual(_retry(func), "ok")
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+        # Rate limits and server errors from geopy are retried, waiting as long as asked
+        mock_sleep.reset_mock()
+        func = Mock(side_effect=[geopy.exc.GeocoderRateLimited("slow down", retry_after=5), geopy.exc.GeocoderServiceError, "ok"])
+        self.assertEqual(_retry(func), "ok")
+        self.assertGreaterEqual(mock_sleep.call_args_list[0].args[0], 5)
+
+        # geopy client errors are raised without retrying
+        func = Mock(side_effect=geopy.exc.GeocoderQueryError)
+        with self.assertRaises(geopy.exc.GeocoderQueryError):
+            _retry(func)
+        func.assert_called_once()
+
+        # Client errors are raised without retrying
+        response = requests.Response()
+        response.status_code = 404
+        func = Mock(side_effect=requests.exceptions.HTTPError(response=response))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            _retry(func)
+        func.assert_called_once()
+
+        # The last transient error is raised once attempts run out
+        func = Mock(side_effect=requests.exceptions.ConnectionError)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            _retry(func, attempts=2)
+        self.assertEqual(func.call_count, 2)
+
+
+    @patch('cli_weather.core.location.get_location')
+    def test_resolve_many(self, mock_get_location):
+        results = {"Anytown": ("123 Main St, Anytown", 34.56, -78.90), "Othertown": ("1 High St, Othertown", 1.0, 2.0)}
+        def fake_get_location(addr):
+            if addr not in results:
+                raise CLIWeatherException(f"Could not find location: '{addr}'")
+            return results[addr]
+        mock_get_location.side_effect = fake_get_location
+
+        self.assertEqual(
+            resolve_many(["Othertown", "Unknown Place", "Anytown"]),
+            [results["Othertown"], (None, None, None), results["Anytown"]]
+        )
+
+
+    @patch('cli_weather.core.location._GEOCODERS', new_callable=lambda: [Mock()])
+    def test_resolve_many_duplicates(self, mock_geocoders):
+        # Workers geocoding the same address all save its cache entry at once
+        barrier = threading.Barrier(4)
+        location = Mock(address="123 Main St, Anytown", latitude=34.56, longitude=-78.90)
+        def geocode(*args, **kwargs):
+            barrier.wait(timeout=5)
+            return location
+        mock_geocoders[0].geocode.side_effect = geocode
+
+        cache_file = Path(self.temp_dir.name) / self.geocode_cache._generate_key("geocode", "anytown")
+        for _ in range(20):
+            cache_file.unlink(missing_ok=True)
+            with self.assertNoLogs(location_logger, "WARNING"):
+                self.assertEqual(resolve_many(["Anytown"] * 4), [("123 Main St, Anytown", 34.56, -78.90)] * 4)
+        self.assertEqual([file for file in cache_file.parent.iterdir() if file.is_file()], [cache_file])
+
+
     def test_save_location(self):
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_config_path = Path(temp_dir) / "config.json"
@@ -233,13 +474,32 @@ class TestLocation(unittest.TestCase):
                 self.assertEqual(updated_config["locations"]["My Location"], "1.23, 4.56")
 
 
+    @patch('builtins.print')
+    @patch('cli_weather.core.location.confirm', return_value=True)
+    @patch('cli_weather.core.location.choose_location', return_value=("London", (51.5074, 0.1278)))
+    def test_delete_location_already_removed(self, mock_choose_location, mock_confirm, mock_print):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_config_path = Path(temp_dir) / "config.json"
+            temp_config_path.write_text(json.dumps({"locations": {"New York": "40.7128, -74.0060"}, "activities": {}}))
+
+            # Location removed by another instance after it was chosen
+            with patch('cli_weather.config.CONFIG_FILE', temp_config_path):
+                delete_location()
+            mock_print.assert_called_with("\n'London' was already removed.")
+            self.assertEqual(json.loads(temp_config_path.read_text())["locations"], {"New York": "40.7128, -74.0060"})
+
+
+    @patch('sys.stdout', new_callable=io.StringIO)
     @patch('builtins.print')
     @patch('cli_weather.core.location.load_locations')
-    def test_view_locations(self, mock_load_locations, mock_print):
+    def test_view_locations(self, mock_load_locations, mock_print, mock_stdout):
         # Test case 1: Locations exist
-        mock_load_locations.return_value = SAMPLE_CONFIG_DATA["locations"]
+        mock_load_locations.return_value = {"London": (51.5074, 0.1278)}
         view_locations()
-        mock_print.assert_any_call("\nYour Locations:\n")  # Use assert_any_call
+        self.assertEqual(
+            mock_stdout.getvalue(),
+            "\nYour Locations:\n\nLondon:\n            latitude: 51.5074\n            longitude: 0.1278\n"
+        )
 
         # Reset the mock
         mock_print.reset_mock()
@@ -251,6 +511,57 @@ class TestLocation(unittest.TestCase):
 
 
 
+class TestConfig(unittest.TestCase):
+
+    def test_load_config_cached(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_config_path = Path(temp_dir) / "config.json"
+            with open(temp_config_path, 'w') as f:
+                json.dump(SAMPLE_CONFIG_DATA, f)
+
+            with patch('cli_weather.config.CONFIG_FILE', temp_config_path):
+                config = load_config()
+                self.assertEqual(config, SAMPLE_CONFIG_DATA)
+
+                # Unchanged file is served from memory
+                with patch('cli_weather.config.open') as mock_file:
+                    self.assertIs(load_config(), config)
+                    mock_file.assert_not_called()
+
+                # Saved data becomes the cached copy
+                save_config({"locations": {}, "activities": {}})
+                self.assertEqual(load_config(), {"locations": {}, "activities": {}})
+
+                # Changes made outside the app are picked up
+                temp_config_path.write_text(json.dumps(SAMPLE_CONFIG_DATA, indent=2))
+                self.assertEqual(load_config(), SAMPLE_CONFIG_DATA)
+
+
+    def test_editing_config(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_config_path = Path(temp_dir) / "config.json"
+            with open(temp_config_path, 'w') as f:
+                json.dump(SAMPLE_CONFIG_DATA, f)
+
+            with patch('cli_weather.config.CONFIG_FILE', temp_config_path):
+                # All changes are saved together
+                with editing_config() as config:
+                    config["locations"]["Paris"] = "48.8566, 2.3522"
+                    del config["locations"]["London"]
+                updated_config = json.loads(temp_config_path.read_text())
+                self.assertEqual(updated_config["locations"], {"New York": "40.7128, -74.0060", "Paris": "48.8566, 2.3522"})
+                self.assertIn('\n    "locations": {', temp_config_path.read_text())  # Same 4 space format with or without orjson
+
+                # Nothing is saved if editing fails
+                with self.assertRaises(KeyError):
+                    with editing_config() as config:
+                        config["locations"]["Tokyo"] = "35.6762, 139.6503"
+                        del config["locations"]["Unknown"]
+                self.assertNotIn("Tokyo", json.loads(temp_config_path.read_text())["locations"])
+                self.assertNotIn("Tokyo", load_config()["locations"])
+
+
+
 class TestActivity(unittest.TestCase):
 
     # Mock necessary functions and data where required.
@@ -271,6 +582,21 @@ class TestActivity(unittest.TestCase):
 
 
 
+    @patch('builtins.print')
+    @patch('cli_weather.core.activity.confirm', return_value=True)
+    @patch('cli_weather.core.activity.load_config', return_value=SAMPLE_CONFIG_DATA)
+    @patch('cli_weather.core.activity.choose_activity', return_value="hiking")
+    def test_delete_activity_already_removed(self, mock_choose_activity, mock_load_config, mock_confirm, mock_print):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_config_path = Path(temp_dir) / "config.json"
+            temp_config_path.write_text(json.dumps({"locations": {}, "activities": {}}))
+
+            # Activity removed by another instance after it was chosen
+            with patch('cli_weather.config.CONFIG_FILE', temp_config_path):
+                delete_activity()
+            mock_print.assert_called_with("\nHiking activity was already removed.")
+
+
     @patch("builtins.input", side_effect=["hiking","15","25","2","10","n","y","10","y", "y"])
     def test_get_activity_criteria(self, mock_input):
         criteria = get_activity_criteria("hiking")